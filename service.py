@@ -3,14 +3,24 @@
 import os
 import sys
 import json
+import time
+import shutil
+import hashlib
+import functools
 import xbmc
 import xbmcaddon
 import xbmcgui
 import xbmcplugin
 import xbmcvfs
 import urllib.parse
-import urllib.request
-import urllib.error
+import urllib3
+
+# orjson es opcional: parsea bytes directamente y es más rápido que json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 __addon__ = xbmcaddon.Addon()
 __author__ = __addon__.getAddonInfo('author')
@@ -19,16 +29,147 @@ __scriptname__ = __addon__.getAddonInfo('name')
 __version__ = __addon__.getAddonInfo('version')
 __language__ = __addon__.getLocalizedString
 
+DEBUG = __addon__.getSettingBool('debug')
+
 __profile__ = xbmcvfs.translatePath(__addon__.getAddonInfo('profile'))
 __temp__ = xbmcvfs.translatePath(os.path.join(__profile__, 'temp', ''))
+__cache__ = os.path.join(__temp__, 'cache', '')
 
 SUBTIS_API_BASE = "https://api.subt.is/v1"
 
+# Prefijo de la URL de descarga y propiedades fijas de cada resultado
+_PLUGIN_PREFIX = f"plugin://{__scriptid__}/?action=download&id="
+_LISTITEM_PROPERTIES = {'sync': 'true', 'hearing_imp': 'false'}
+
+# Propiedades del video en reproducción pedidas a Player.GetItem
+_PLAYER_ITEM_PROPERTIES = [
+    'title', 'originaltitle', 'year', 'season', 'episode',
+    'showtitle', 'imdbnumber'
+]
+
+# Esquemas de streams remotos cuyo tamaño no se puede obtener con Stat
+# (http/https sí se consultan: el VFS de Kodi devuelve el Content-Length)
+_STREAM_PREFIXES = ('rtmp://', 'rtsp://', 'plugin://')
+
+# Pool de conexiones compartido durante toda la vida del proceso para
+# reutilizar la conexión TCP/TLS entre peticiones a la API. Sin reintentos
+# (igual que urlopen) para no multiplicar la espera si la API no responde,
+# pero siguiendo las redirecciones
+_http = urllib3.PoolManager(
+    maxsize=8,
+    retries=urllib3.Retry(
+        total=None, connect=0, read=0, status=0, other=0, redirect=5
+    ),
+    headers={'User-Agent': f'Kodi Subtis Addon/{__version__}'}
+)
+
+# Nombres de idioma por código ISO
+LANGUAGES = {
+    'es': 'Spanish',
+    'en': 'English',
+    'fr': 'French',
+    'de': 'German',
+    'it': 'Italian',
+    'pt': 'Portuguese',
+}
+
+# Tiempo de vida (en segundos) de las respuestas cacheadas de la API
+CACHE_TTL = 3600
+CACHE_MAX_AGE = 24 * 3600
+CACHE_MEMORY_SIZE = 32
+
+# Caché en memoria para la invocación actual del addon
+_memory_cache = {}
+
 
 def log(msg):
     xbmc.log(f"### SUBTIS ### {msg}", level=xbmc.LOGINFO)
 
 
+def dlog(msg_fn):
+    """
+    Log a message only when the addon debug setting is enabled
+    
+    Args:
+        msg_fn: Callable returning the message, so it is only built when needed
+    """
+    if DEBUG:
+        log(msg_fn())
+
+
+def _cache_file(key):
+    """Return the on-disk cache path for the given key"""
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(__cache__, f"{digest}.json")
+
+
+def _cache_get(key):
+    """
+    Get a cached value if it has not expired
+    
+    Args:
+        key: The cache key (usually the request URL)
+    
+    Returns:
+        The cached value or None if missing or expired
+    """
+    if key in _memory_cache:
+        return _memory_cache[key]
+    
+    try:
+        with open(_cache_file(key), 'rb') as f:
+            entry = _json_loads(f.read())
+        
+        if time.time() - entry.get('t', 0) >= CACHE_TTL:
+            return None
+        
+        value = entry.get('v')
+    except:
+        return None
+    
+    # Renovar el TTL en cada acierto
+    _cache_put(key, value)
+    return value
+
+
+def _cache_put(key, value):
+    """
+    Store a value in the memory and on-disk caches
+    
+    Args:
+        key: The cache key (usually the request URL)
+        value: JSON serializable value to store
+    """
+    if key not in _memory_cache and len(_memory_cache) >= CACHE_MEMORY_SIZE:
+        _memory_cache.pop(next(iter(_memory_cache)))
+    _memory_cache[key] = value
+    
+    try:
+        os.makedirs(__cache__, exist_ok=True)
+        path = _cache_file(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'t': time.time(), 'v': value}, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log(f"Could not write cache entry: {str(e)}")
+
+
+def clean_cache():
+    """Remove on-disk cache entries older than CACHE_MAX_AGE"""
+    if not os.path.isdir(__cache__):
+        return
+    
+    now = time.time()
+    for file_name in os.listdir(__cache__):
+        path = os.path.join(__cache__, file_name)
+        try:
+            if now - os.path.getmtime(path) > CACHE_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+
 def make_request(url):
     """
     Make an HTTP GET request to the specified URL
@@ -39,15 +180,20 @@ def make_request(url):
     Returns:
         Dictionary with the JSON response or None if error
     """
+    cached = _cache_get(url)
+    if cached is not None:
+        return cached
+    
     try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', f'Kodi Subtis Addon/{__version__}')
-        
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = response.read()
-            return json.loads(data.decode('utf-8'))
+        response = _http.request('GET', url, timeout=10)
+        if response.status != 200:
+            return None
+        data = _json_loads(response.data)
     except:
         return None
+    
+    _cache_put(url, data)
+    return data
 
 
 def make_request_with_status(url):
@@ -59,21 +205,35 @@ def make_request_with_status(url):
     
     Returns:
         Tuple (response_data, status_code) where response_data is dictionary or None
+    
+    Note:
+        Cached responses are returned with status 200, but responses are not
+        stored here: the caller decides whether a response is worth caching
     """
+    cached = _cache_get(url)
+    if cached is not None:
+        return cached, 200
+    
     try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', f'Kodi Subtis Addon/{__version__}')
-        
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = response.read()
-            status_code = response.getcode()
-            return json.loads(data.decode('utf-8')), status_code
-    except urllib.error.HTTPError as e:
-        return None, e.code
+        response = _http.request('GET', url, timeout=10)
+    except:
+        return None, 0
+    
+    if response.status >= 400:
+        return None, response.status
+    
+    try:
+        return _json_loads(response.data), response.status
     except:
         return None, 0
 
 
+@functools.lru_cache(maxsize=256)
+def _quote_path_segment(value):
+    """Percent-encode a value to be used as a single URL path segment"""
+    return urllib.parse.quote(value, safe='')
+
+
 def search_subtitles(item):
     """
     Search for subtitles based on file size and file name
@@ -86,39 +246,28 @@ def search_subtitles(item):
     """
     subtitles_list = []
     
-    # Log datos relevantes
-    log("=" * 60)
-
     title = item.get('title', '')
-    log(f"Title: '{title}'")
-    
     file_name = item.get('file_name', '')
-    log(f"File name: '{file_name}'")
-    
     imdb_id = item.get('imdb', '')
-    log(f"IMDb ID: '{imdb_id}'")
-    
     file_size = item.get('file_size', 0)
-    log(f"File size (bytes): {file_size}")
-
+    
+    # Log datos relevantes
+    dlog(lambda: f"Search: title='{title}' file='{file_name}' imdb='{imdb_id}' size={file_size}")
     
     if not file_name or not file_size:
         log("ERROR: File name or file size missing")
         return subtitles_list
     
     # Codificar el nombre del archivo para la URL
-    encoded_filename = urllib.parse.quote(file_name)
+    encoded_filename = _quote_path_segment(file_name)
     
     # Construir la URL de búsqueda por file_size y file_name
     search_url = f"{SUBTIS_API_BASE}/subtitle/file/name/{file_size}/{encoded_filename}"
-    log(f"Search URL: {search_url}")
+    dlog(lambda: f"Search URL: {search_url}")
     
     # Hacer la petición a la API
     response_data, status_code = make_request_with_status(search_url)
-    log(f"Response status code: {status_code}")
-    
-    if response_data:
-        log(f"Response data: {response_data}")
+    dlog(lambda: f"Response: status={status_code} data={response_data}")
     
     if not response_data or status_code != 200:
         log(f"No subtitles found or error occurred (status: {status_code})")
@@ -139,6 +288,11 @@ def search_subtitles(item):
         log("No subtitle ID found")
         return subtitles_list
     
+    # Cachear solo las respuestas que contienen un subtítulo, para que una
+    # búsqueda sin resultados se repita y detecte subtítulos nuevos
+    if search_url not in _memory_cache:
+        _cache_put(search_url, response_data)
+    
     # Información adicional
     subtitle_file_name = subtitle_data.get('subtitle_file_name', file_name)
     title_name = title_data.get('title_name', 'Unknown')
@@ -155,20 +309,24 @@ def search_subtitles(item):
     # Rating siempre en 0
     listitem.setArt({'icon': '0'})
     
-    # Propiedades del subtítulo
-    listitem.setProperty("sync", "true")
-    listitem.setProperty("hearing_imp", "false")
+    # Propiedades del subtítulo (setProperties solo existe desde Kodi 20)
+    if hasattr(listitem, 'setProperties'):
+        listitem.setProperties(_LISTITEM_PROPERTIES)
+    else:
+        for key, value in _LISTITEM_PROPERTIES.items():
+            listitem.setProperty(key, value)
     
     # URL para descargar este subtítulo
-    url = f"plugin://{__scriptid__}/?action=download&id={subtitle_id}"
+    url = _PLUGIN_PREFIX + str(subtitle_id)
     
     subtitles_list.append((url, listitem, False))
     
-    log(f"Found {len(subtitles_list)} subtitle(s)")
-    log("=" * 60)
+    dlog(lambda: f"Result: id={subtitle_id} file={subtitle_file_name} title={title_name} year={year}")
+    log(f"SEARCH COMPLETE: found {len(subtitles_list)} subtitle(s)")
     return subtitles_list
 
 
+@functools.lru_cache(maxsize=32)
 def get_language_name(language_code):
     """
     Convert language code to full language name
@@ -179,15 +337,9 @@ def get_language_name(language_code):
     Returns:
         Full language name
     """
-    languages = {
-        'es': 'Spanish',
-        'en': 'English',
-        'fr': 'French',
-        'de': 'German',
-        'it': 'Italian',
-        'pt': 'Portuguese',
-    }
-    return languages.get(language_code.lower(), language_code.upper())
+    return (LANGUAGES.get(language_code)
+            or LANGUAGES.get(language_code.lower())
+            or language_code.upper())
 
 
 def download_subtitle(subtitle_id):
@@ -211,28 +363,26 @@ def download_subtitle(subtitle_id):
     download_url = f"{SUBTIS_API_BASE}/subtitle/link/{subtitle_id}"
     log(f"Download URL: {download_url}")
     
+    # Guardar el subtítulo en el directorio temporal. Se escribe primero en
+    # un archivo .tmp para no dejar un subtítulo truncado si la descarga falla
+    subtitle_path = os.path.join(__temp__, f"subtis_{subtitle_id}.srt")
+    tmp_path = f"{subtitle_path}.tmp"
+    
+    response = None
     try:
-        req = urllib.request.Request(download_url)
-        req.add_header('User-Agent', f'Kodi Subtis Addon/{__version__}')
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            status_code = response.getcode()
-            log(f"Download response status code: {status_code}")
-            
-            subtitle_content = response.read().decode('utf-8')
-            content_length = len(subtitle_content)
-            log(f"Downloaded content length: {content_length} characters")
-            
-            # Log primeras líneas del subtítulo para debug
-            first_lines = '\n'.join(subtitle_content.split('\n')[:5])
-            log(f"First lines of subtitle:\n{first_lines}")
+        response = _http.request('GET', download_url, timeout=30, preload_content=False)
+        status_code = response.status
+        log(f"Download response status code: {status_code}")
         
-        # Guardar el subtítulo en el directorio temporal
-        subtitle_path = os.path.join(__temp__, f"subtis_{subtitle_id}.srt")
+        if status_code >= 400:
+            raise Exception(f"HTTP Error {status_code}")
         
-        with open(subtitle_path, 'w', encoding='utf-8') as f:
-            f.write(subtitle_content)
+        # Copiar el contenido en bloques sin cargarlo entero en memoria
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(response, f, length=65536)
+        os.replace(tmp_path, subtitle_path)
         
+        dlog(lambda: f"Downloaded content length: {os.path.getsize(subtitle_path)} bytes")
         log(f"Subtitle saved to: {subtitle_path}")
         log("=" * 60)
         return [subtitle_path]
@@ -240,7 +390,42 @@ def download_subtitle(subtitle_id):
     except Exception as e:
         log(f"ERROR downloading subtitle: {str(e)}")
         log("=" * 60)
+        
+        # Descartar la respuesta a medio leer para no devolver al pool una
+        # conexión sucia, y borrar el archivo parcial
+        if response is not None:
+            response.drain_conn()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return []
+    
+    finally:
+        if response is not None:
+            response.release_conn()
+
+
+def get_playing_item():
+    """
+    Get the properties of the video being played with a single JSON-RPC call
+    
+    Returns:
+        Dictionary with the Player.GetItem properties or empty dict if error
+    """
+    request = json.dumps({
+        'jsonrpc': '2.0',
+        'method': 'Player.GetItem',
+        'params': {'playerid': 1, 'properties': _PLAYER_ITEM_PROPERTIES},
+        'id': 1
+    })
+    
+    try:
+        response = _json_loads(xbmc.executeJSONRPC(request))
+        return response['result']['item']
+    except Exception as e:
+        log(f"Could not get playing item: {str(e)}")
+        return {}
 
 
 def get_params():
@@ -260,29 +445,34 @@ def main():
     
     action = params.get('action')
     
+    clean_cache()
+    
     if action == 'search':
         # Obtener información del video actual
+        playing_item = get_playing_item()
+        playing_file = xbmc.Player().getPlayingFile()
+        
         item = {}
         item['temp'] = False
         item['rar'] = False
-        item['year'] = xbmc.getInfoLabel("VideoPlayer.Year")
-        item['season'] = str(xbmc.getInfoLabel("VideoPlayer.Season"))
-        item['episode'] = str(xbmc.getInfoLabel("VideoPlayer.Episode"))
-        item['tvshow'] = xbmc.getInfoLabel("VideoPlayer.TVshowtitle")
-        item['title'] = xbmc.getInfoLabel("VideoPlayer.OriginalTitle")
-        item['file_original_path'] = urllib.parse.unquote(
-            xbmc.Player().getPlayingFile()
-        )
-        item['imdb'] = xbmc.getInfoLabel("VideoPlayer.IMDBNumber")
+        item['year'] = playing_item.get('year', 0)
+        item['season'] = playing_item.get('season', -1)
+        item['episode'] = playing_item.get('episode', -1)
+        item['tvshow'] = playing_item.get('showtitle', '')
+        item['title'] = (playing_item.get('originaltitle')
+                         or playing_item.get('title')
+                         or playing_item.get('label', ''))
+        item['file_original_path'] = urllib.parse.unquote(playing_file)
+        item['imdb'] = playing_item.get('imdbnumber', '')
         
         # Extraer el nombre del archivo desde la ruta completa
-        playing_file = xbmc.Player().getPlayingFile()
         item['file_name'] = os.path.basename(playing_file)
         
-        # Get file size in bytes
+        # Get file size in bytes (los streams remotos no se pueden consultar)
         try:
-            playing_file = xbmc.Player().getPlayingFile()
-            if xbmcvfs.exists(playing_file):
+            if playing_file.startswith(_STREAM_PREFIXES):
+                item['file_size'] = 0
+            elif xbmcvfs.exists(playing_file):
                 stat = xbmcvfs.Stat(playing_file)
                 item['file_size'] = stat.st_size()
             else:
@@ -291,9 +481,6 @@ def main():
             log(f"Could not get file size: {str(e)}")
             item['file_size'] = 0
         
-        if item['title'] == "":
-            item['title'] = xbmc.getInfoLabel("VideoPlayer.Title")
-        
         # Buscar subtítulos
         subtitles_list = search_subtitles(item)
         